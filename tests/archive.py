@@ -255,13 +255,10 @@ class ArchiveTest(ProbackupTest, unittest.TestCase):
 
         gdb.continue_execution_until_exit()
 
-        log_file = os.path.join(backup_dir, 'log/pg_probackup.log')
-        with open(log_file, 'r') as f:
-            log_content = f.read()
-            self.assertNotIn(
-                "ERROR: pg_stop_backup doesn't answer",
-                log_content,
-                "pg_stop_backup timeouted")
+        self.assert_log_contains(
+            os.path.join(backup_dir, 'log', 'pg_probackup.log'),
+            "ERROR: pg_stop_backup doesn't answer",
+            msg="pg_stop_backup timeouted", negate=True)
 
         log_file = os.path.join(node.logs_dir, 'postgresql.log')
         with open(log_file, 'r') as f:
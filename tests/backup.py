@@ -1,181 +1,166 @@
 import unittest
 import os
-from time import sleep
-from .helpers.ptrack_helpers import ProbackupTest, ProbackupException
+import stat
+from .helpers.ptrack_helpers import ProbackupTest, ProbackupException, \
+    serial, find_files_by_name
 
 
 module_name = 'backup'
 
+# For tests, which don't check durability. fsync is
+# already disabled by make_simple_node().
+no_durability_options = {
+    'synchronous_commit': 'off',
+    'full_page_writes': 'off'}
+
 
 class BackupTest(ProbackupTest, unittest.TestCase):
 
+    # Tests, which don't check ARCHIVE WAL delivery, take backups
+    # in STREAM mode. Set to False to deliver WAL via archive_command.
+    PREFER_STREAM = True
+
+    # Restore copies files in parallel, use all cores,
+    # but not too many to not overload shared CI hosts
+    restore_jobs = str(min(os.cpu_count() or 4, 16))
+
+    def setUp(self):
+        self.fname = self.id().rsplit('.', 1)[-1]
+        # absolute path, so it can be passed as base_dir
+        # to make_simple_node() too
+        self.test_base = os.path.join(self.tmp_path, module_name, self.fname)
+        self.backup_dir = os.path.join(self.test_base, 'backup')
+
+    def make_env(
+            self, initdb_params=None, pg_options=None,
+            set_replication=False, archiving=True, pooled=False,
+            pgbench_scale=None):
+        """
+        Make node from initdb template, backup catalog with
+        instance 'node' for it, start the node.
+        With 'pooled' running node is taken from node pool instead,
+        such node cannot be reconfigured, e.g. for archiving.
+        With 'pgbench_scale' node already contains pgbench tables.
+        Return (node, backup_dir)
+        """
+        if initdb_params is None:
+            initdb_params = ['--data-checksums']
+
+        if pooled:
+            self.assertFalse(
+                archiving, 'Archiving cannot be enabled for pooled node')
+            self.assertFalse(
+                pgbench_scale, 'pgbench tables cannot be used with pooled node')
+            node = self.make_pooled_node(
+                set_replication=set_replication,
+                initdb_params=initdb_params,
+                pg_options=pg_options or {})
+        else:
+            if pgbench_scale:
+                template = self.get_pgbench_template(
+                    initdb_params, scale=pgbench_scale)
+            else:
+                template = self.get_initdb_template(initdb_params)
+
+            node = self.make_simple_node(
+                base_dir=os.path.join(self.test_base, 'node'),
+                set_replication=set_replication,
+                initdb_params=initdb_params,
+                template=template,
+                pg_options=pg_options or {})
+
+        self.init_pb(self.backup_dir)
+        self.add_instance(self.backup_dir, 'node', node)
+        if archiving:
+            self.set_archiving(self.backup_dir, 'node', node)
+        if not pooled:
+            node.slow_start()
+
+        return node, self.backup_dir
+
+    def wal_delivery_options(self):
+        """
+        Backup options for tests, which don't check ARCHIVE WAL delivery,
+        see PREFER_STREAM
+        """
+        return ['--stream'] if self.PREFER_STREAM else []
+
     # @unittest.skip("skip")
     # @unittest.expectedFailure
     # PGPRO-707
     def test_backup_modes_archive(self):
         """standart backup modes with ARCHIVE WAL method"""
-        fname = self.id().split('.')[3]
-        node = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node'),
-            initdb_params=['--data-checksums'],
-            pg_options={
-                'ptrack_enable': 'on'})
-
-        backup_dir = os.path.join(self.tmp_path, module_name, fname, 'backup')
-        self.init_pb(backup_dir)
-        self.add_instance(backup_dir, 'node', node)
-        self.set_archiving(backup_dir, 'node', node)
-        node.slow_start()
+        node, backup_dir = self.make_env(
+            pg_options={'ptrack_enable': 'on'})
 
         backup_id = self.backup_node(backup_dir, 'node', node)
-        show_backup = self.show_pb(backup_dir, 'node')[0]
-
-        self.assertEqual(show_backup['status'], "OK")
-        self.assertEqual(show_backup['backup-mode'], "FULL")
 
         # postmaster.pid and postmaster.opts shouldn't be copied
-        excluded = True
         db_dir = os.path.join(
             backup_dir, "backups", 'node', backup_id, "database")
 
-        for f in os.listdir(db_dir):
-            if (
-                os.path.isfile(os.path.join(db_dir, f)) and
-                (
-                    f == "postmaster.pid" or
-                    f == "postmaster.opts"
-                )
-            ):
-                excluded = False
-                self.assertEqual(excluded, True)
+        self.assertFalse(
+            os.path.exists(os.path.join(db_dir, 'postmaster.pid')))
+        self.assertFalse(
+            os.path.exists(os.path.join(db_dir, 'postmaster.opts')))
 
         # page backup mode
         page_backup_id = self.backup_node(
             backup_dir, 'node', node, backup_type="page")
 
-        # print self.show_pb(node)
-        show_backup = self.show_pb(backup_dir, 'node')[1]
-        self.assertEqual(show_backup['status'], "OK")
-        self.assertEqual(show_backup['backup-mode'], "PAGE")
+        # ptrack backup mode
+        ptrack_backup_id = self.backup_node(
+            backup_dir, 'node', node, backup_type="ptrack")
+
+        # get all backups at once
+        backups = dict(
+            (backup['id'], backup)
+            for backup in self.show_pb(backup_dir, 'node'))
+
+        self.assertEqual(backups[backup_id]['status'], "OK")
+        self.assertEqual(backups[backup_id]['backup-mode'], "FULL")
+
+        self.assertEqual(backups[page_backup_id]['status'], "OK")
+        self.assertEqual(backups[page_backup_id]['backup-mode'], "PAGE")
 
         # Check parent backup
         self.assertEqual(
             backup_id,
-            self.show_pb(
-                backup_dir, 'node',
-                backup_id=show_backup['id'])["parent-backup-id"])
+            backups[page_backup_id]['parent-backup-id'])
 
-        # ptrack backup mode
-        self.backup_node(backup_dir, 'node', node, backup_type="ptrack")
-
-        show_backup = self.show_pb(backup_dir, 'node')[2]
-        self.assertEqual(show_backup['status'], "OK")
-        self.assertEqual(show_backup['backup-mode'], "PTRACK")
+        self.assertEqual(backups[ptrack_backup_id]['status'], "OK")
+        self.assertEqual(backups[ptrack_backup_id]['backup-mode'], "PTRACK")
 
         # Check parent backup
         self.assertEqual(
             page_backup_id,
-            self.show_pb(
-                backup_dir, 'node',
-                backup_id=show_backup['id'])["parent-backup-id"])
+            backups[ptrack_backup_id]['parent-backup-id'])
 
         # Clean after yourself
-        self.del_test_dir(module_name, fname)
+        self.del_test_dir(module_name, self.fname)
 
     # @unittest.skip("skip")
     def test_smooth_checkpoint(self):
         """full backup with smooth checkpoint"""
-        fname = self.id().split('.')[3]
-        node = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node'),
-            initdb_params=['--data-checksums'])
-
-        backup_dir = os.path.join(self.tmp_path, module_name, fname, 'backup')
-        self.init_pb(backup_dir)
-        self.add_instance(backup_dir, 'node', node)
-        self.set_archiving(backup_dir, 'node', node)
-        node.slow_start()
+        node, backup_dir = self.make_env(
+            set_replication=self.PREFER_STREAM,
+            archiving=not self.PREFER_STREAM)
+        wal_options = self.wal_delivery_options()
 
         self.backup_node(
             backup_dir, 'node', node,
-            options=["-C"])
-        self.assertEqual(self.show_pb(backup_dir, 'node')[0]['status'], "OK")
+            options=["-C"] + wal_options)
         node.stop()
 
         # Clean after yourself
-        self.del_test_dir(module_name, fname)
-
-    # @unittest.skip("skip")
-    def test_incremental_backup_without_full(self):
-        """page-level backup without validated full backup"""
-        fname = self.id().split('.')[3]
-        node = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node'),
-            initdb_params=['--data-checksums'],
-            pg_options={'ptrack_enable': 'on'})
-
-        backup_dir = os.path.join(self.tmp_path, module_name, fname, 'backup')
-        self.init_pb(backup_dir)
-        self.add_instance(backup_dir, 'node', node)
-        self.set_archiving(backup_dir, 'node', node)
-        node.slow_start()
-
-        try:
-            self.backup_node(backup_dir, 'node', node, backup_type="page")
-            # we should die here because exception is what we expect to happen
-            self.assertEqual(
-                1, 0,
-                "Expecting Error because page backup should not be possible "
-                "without valid full backup.\n Output: {0} \n CMD: {1}".format(
-                    repr(self.output), self.cmd))
-        except ProbackupException as e:
-            self.assertIn(
-                "ERROR: Valid backup on current timeline is not found. "
-                "Create new FULL backup before an incremental one.",
-                e.message,
-                "\n Unexpected Error Message: {0}\n CMD: {1}".format(
-                    repr(e.message), self.cmd))
-
-        sleep(1)
-
-        try:
-            self.backup_node(backup_dir, 'node', node, backup_type="ptrack")
-            # we should die here because exception is what we expect to happen
-            self.assertEqual(
-                1, 0,
-                "Expecting Error because page backup should not be possible "
-                "without valid full backup.\n Output: {0} \n CMD: {1}".format(
-                    repr(self.output), self.cmd))
-        except ProbackupException as e:
-            self.assertIn(
-                "ERROR: Valid backup on current timeline is not found. "
-                "Create new FULL backup before an incremental one.",
-                e.message,
-                "\n Unexpected Error Message: {0}\n CMD: {1}".format(
-                    repr(e.message), self.cmd))
-
-        self.assertEqual(
-            self.show_pb(backup_dir, 'node')[0]['status'],
-            "ERROR")
-
-        # Clean after yourself
-        self.del_test_dir(module_name, fname)
+        self.del_test_dir(module_name, self.fname)
 
     # @unittest.skip("skip")
     def test_incremental_backup_corrupt_full(self):
         """page-level backup with corrupted full backup"""
-        fname = self.id().split('.')[3]
-        node = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node'),
-            initdb_params=['--data-checksums'],
+        node, backup_dir = self.make_env(
             pg_options={'ptrack_enable': 'on'})
 
-        backup_dir = os.path.join(self.tmp_path, module_name, fname, 'backup')
-        self.init_pb(backup_dir)
-        self.add_instance(backup_dir, 'node', node)
-        self.set_archiving(backup_dir, 'node', node)
-        node.slow_start()
-
         backup_id = self.backup_node(backup_dir, 'node', node)
         file = os.path.join(
             backup_dir, "backups", "node", backup_id,
@@ -218,102 +203,67 @@ class BackupTest(ProbackupTest, unittest.TestCase):
                 "\n Unexpected Error Message: {0}\n CMD: {1}".format(
                     repr(e.message), self.cmd))
 
-        self.assertEqual(
-            self.show_pb(backup_dir, 'node', backup_id)['status'], "CORRUPT")
-        self.assertEqual(
-            self.show_pb(backup_dir, 'node')[1]['status'], "ERROR")
+        backups = self.show_pb(backup_dir, 'node')
+        self.assertEqual(backups[0]['id'], backup_id)
+        self.assertEqual(backups[0]['status'], "CORRUPT")
+        self.assertEqual(backups[1]['status'], "ERROR")
 
         # Clean after yourself
-        self.del_test_dir(module_name, fname)
+        self.del_test_dir(module_name, self.fname)
 
     # @unittest.skip("skip")
     def test_ptrack_threads(self):
         """ptrack multi thread backup mode"""
-        fname = self.id().split('.')[3]
-        node = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node'),
-            initdb_params=['--data-checksums'],
-            pg_options={'ptrack_enable': 'on'})
-
-        backup_dir = os.path.join(self.tmp_path, module_name, fname, 'backup')
-        self.init_pb(backup_dir)
-        self.add_instance(backup_dir, 'node', node)
-        self.set_archiving(backup_dir, 'node', node)
-        node.slow_start()
+        node, backup_dir = self.make_env(
+            pg_options={'ptrack_enable': 'on'},
+            set_replication=self.PREFER_STREAM,
+            archiving=not self.PREFER_STREAM)
+        wal_options = self.wal_delivery_options()
 
         self.backup_node(
             backup_dir, 'node', node,
-            backup_type="full", options=["-j", "4"])
-        self.assertEqual(self.show_pb(backup_dir, 'node')[0]['status'], "OK")
+            backup_type="full", options=["-j", "4"] + wal_options)
 
         self.backup_node(
             backup_dir, 'node', node,
-            backup_type="ptrack", options=["-j", "4"])
-        self.assertEqual(self.show_pb(backup_dir, 'node')[0]['status'], "OK")
+            backup_type="ptrack", options=["-j", "4"] + wal_options)
 
         # Clean after yourself
-        self.del_test_dir(module_name, fname)
+        self.del_test_dir(module_name, self.fname)
 
     # @unittest.skip("skip")
     def test_ptrack_threads_stream(self):
         """ptrack multi thread backup mode and stream"""
-        fname = self.id().split('.')[3]
-        node = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node'),
+        node, backup_dir = self.make_env(
+            pg_options={'ptrack_enable': 'on'},
             set_replication=True,
-            initdb_params=['--data-checksums'],
-            pg_options={
-                'ptrack_enable': 'on'})
-
-        backup_dir = os.path.join(self.tmp_path, module_name, fname, 'backup')
-        self.init_pb(backup_dir)
-        self.add_instance(backup_dir, 'node', node)
-        node.slow_start()
+            archiving=False,
+            pooled=True)
 
         self.backup_node(
             backup_dir, 'node', node, backup_type="full",
             options=["-j", "4", "--stream"])
 
-        self.assertEqual(self.show_pb(backup_dir, 'node')[0]['status'], "OK")
         self.backup_node(
             backup_dir, 'node', node,
             backup_type="ptrack", options=["-j", "4", "--stream"])
-        self.assertEqual(self.show_pb(backup_dir, 'node')[1]['status'], "OK")
 
         # Clean after yourself
-        self.del_test_dir(module_name, fname)
+        self.del_test_dir(module_name, self.fname)
 
     # @unittest.skip("skip")
     def test_page_corruption_heal_via_ptrack_1(self):
         """make node, corrupt some page, check that backup failed"""
-        fname = self.id().split('.')[3]
-        node = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node'),
+        node, backup_dir = self.make_env(
+            pg_options=no_durability_options,
             set_replication=True,
-            initdb_params=['--data-checksums'])
-
-        backup_dir = os.path.join(self.tmp_path, module_name, fname, 'backup')
-
-        self.init_pb(backup_dir)
-        self.add_instance(backup_dir, 'node', node)
-        node.slow_start()
+            archiving=False)
 
         self.backup_node(
             backup_dir, 'node', node,
             backup_type="full", options=["-j", "4", "--stream"])
 
-        node.safe_psql(
-            "postgres",
-            "create table t_heap as select 1 as id, md5(i::text) as text, "
-            "md5(repeat(i::text,10))::tsvector as tsvector "
-            "from generate_series(0,1000) i")
-        node.safe_psql(
-            "postgres",
-            "CHECKPOINT;")
-
-        heap_path = node.safe_psql(
-            "postgres",
-            "select pg_relation_filepath('t_heap')").rstrip()
+        heap_path = self.populate_t_heap(node, checkpoint=True)
 
         with open(os.path.join(node.data_dir, heap_path), "rb+", 0) as f:
                 f.seek(9000)
@@ -321,55 +271,33 @@ class BackupTest(ProbackupTest, unittest.TestCase):
                 f.flush()
                 f.close
 
+        # backup_node() raises ProbackupException if backup fails
         self.backup_node(
             backup_dir, 'node', node, backup_type="full",
             options=["-j", "4", "--stream", "--log-level-file=verbose"])
 
         # open log file and check
-        with open(os.path.join(backup_dir, 'log', 'pg_probackup.log')) as f:
-            log_content = f.read()
-            self.assertIn('block 1, try to fetch via SQL', log_content)
-            self.assertIn('SELECT pg_catalog.pg_ptrack_get_block', log_content)
-            f.close
-
-        self.assertTrue(
-            self.show_pb(backup_dir, 'node')[1]['status'] == 'OK',
-            "Backup Status should be OK")
+        self.assert_log_contains(
+            os.path.join(backup_dir, 'log', 'pg_probackup.log'),
+            'block 1, try to fetch via SQL',
+            'SELECT pg_catalog.pg_ptrack_get_block')
 
         # Clean after yourself
-        self.del_test_dir(module_name, fname)
+        self.del_test_dir(module_name, self.fname)
 
     # @unittest.skip("skip")
     def test_page_corruption_heal_via_ptrack_2(self):
         """make node, corrupt some page, check that backup failed"""
-        fname = self.id().split('.')[3]
-        node = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node'),
+        node, backup_dir = self.make_env(
+            pg_options=no_durability_options,
             set_replication=True,
-            initdb_params=['--data-checksums'])
-
-        backup_dir = os.path.join(self.tmp_path, module_name, fname, 'backup')
-
-        self.init_pb(backup_dir)
-        self.add_instance(backup_dir, 'node', node)
-        node.slow_start()
+            archiving=False)
 
         self.backup_node(
             backup_dir, 'node', node, backup_type="full",
             options=["-j", "4", "--stream"])
 
-        node.safe_psql(
-            "postgres",
-            "create table t_heap as select 1 as id, md5(i::text) as text, "
-            "md5(repeat(i::text,10))::tsvector as tsvector "
-            "from generate_series(0,1000) i")
-        node.safe_psql(
-            "postgres",
-            "CHECKPOINT;")
-
-        heap_path = node.safe_psql(
-            "postgres",
-            "select pg_relation_filepath('t_heap')").rstrip()
+        heap_path = self.populate_t_heap(node, checkpoint=True)
         node.stop()
 
         with open(os.path.join(node.data_dir, heap_path), "rb+", 0) as f:
@@ -421,22 +349,15 @@ class BackupTest(ProbackupTest, unittest.TestCase):
              "Backup Status should be ERROR")
 
         # Clean after yourself
-        self.del_test_dir(module_name, fname)
+        self.del_test_dir(module_name, self.fname)
 
     # @unittest.skip("skip")
     def test_tablespace_in_pgdata_pgpro_1376(self):
         """PGPRO-1376 """
-        fname = self.id().split('.')[3]
-        node = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node'),
+        node, backup_dir = self.make_env(
+            pg_options=no_durability_options,
             set_replication=True,
-            initdb_params=['--data-checksums'])
-
-        backup_dir = os.path.join(self.tmp_path, module_name, fname, 'backup')
-
-        self.init_pb(backup_dir)
-        self.add_instance(backup_dir, 'node', node)
-        node.slow_start()
+            archiving=False)
 
         self.create_tblspace_in_node(
             node, 'tblspace1',
@@ -450,30 +371,18 @@ class BackupTest(ProbackupTest, unittest.TestCase):
             tblspc_path=(os.path.join(node.data_dir))
             )
 
-        node.safe_psql(
-            "postgres",
-            "create table t_heap1 tablespace tblspace1 as select 1 as id, "
-            "md5(i::text) as text, "
-            "md5(repeat(i::text,10))::tsvector as tsvector "
-            "from generate_series(0,1000) i")
+        # relfilenode is the name of the table file
+        relfilenode = os.path.basename(
+            self.populate_t_heap(node, 't_heap1', tablespace='tblspace1'))
 
-        node.safe_psql(
-            "postgres",
-            "create table t_heap2 tablespace tblspace2 as select 1 as id, "
-            "md5(i::text) as text, "
-            "md5(repeat(i::text,10))::tsvector as tsvector "
-            "from generate_series(0,1000) i")
+        self.populate_t_heap(node, 't_heap2', tablespace='tblspace2')
 
         backup_id_1 = self.backup_node(
             backup_dir, 'node', node, backup_type="full",
             options=["-j", "4", "--stream"])
 
-        node.safe_psql(
-            "postgres",
-            "drop table t_heap2")
-        node.safe_psql(
-            "postgres",
-            "drop tablespace tblspace2")
+        self.pg_exec(node, "drop table t_heap2")
+        self.pg_exec(node, "drop tablespace tblspace2")
 
         self.backup_node(
                 backup_dir, 'node', node, backup_type="full",
@@ -481,18 +390,9 @@ class BackupTest(ProbackupTest, unittest.TestCase):
 
         pgdata = self.pgdata_content(node.data_dir)
 
-        relfilenode = node.safe_psql(
-            "postgres",
-            "select 't_heap1'::regclass::oid"
-            ).rstrip()
-
-        list = []
-        for root, dirs, files in os.walk(os.path.join(
-                backup_dir, 'backups', 'node', backup_id_1)):
-            for file in files:
-                if file == relfilenode:
-                    path = os.path.join(root, file)
-                    list = list + [path]
+        list = find_files_by_name(
+            os.path.join(backup_dir, 'backups', 'node', backup_id_1),
+            relfilenode)
 
         # We expect that relfilenode occures only once
         if len(list) > 1:
@@ -508,34 +408,27 @@ class BackupTest(ProbackupTest, unittest.TestCase):
         node.cleanup()
 
         self.restore_node(
-            backup_dir, 'node', node, options=["-j", "4"])
+            backup_dir, 'node', node, options=["-j", self.restore_jobs])
 
         if self.paranoia:
             pgdata_restored = self.pgdata_content(node.data_dir)
             self.compare_pgdata(pgdata, pgdata_restored)
 
         # Clean after yourself
-        self.del_test_dir(module_name, fname)
+        self.del_test_dir(module_name, self.fname)
 
     # @unittest.skip("skip")
     def test_basic_tablespace_handling(self):
         """
-        make node, take full backup, check that restore with
-        tablespace mapping will end with error, take page backup,
-        check that restore with tablespace mapping will end with
-        success
+        make node, take full backup, create tablespaces, take delta backup,
+        check that restore with tablespace mapping will end with success.
+        Restore of full backup with the same mapping must fail, it is
+        checked in BackupErrorsTest.test_tablespace_mapping_errors
         """
-        fname = self.id().split('.')[3]
-        node = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node'),
+        node, backup_dir = self.make_env(
+            pg_options=no_durability_options,
             set_replication=True,
-            initdb_params=['--data-checksums'])
-
-        backup_dir = os.path.join(self.tmp_path, module_name, fname, 'backup')
-
-        self.init_pb(backup_dir)
-        self.add_instance(backup_dir, 'node', node)
-        node.slow_start()
+            archiving=False)
 
         self.backup_node(
             backup_dir, 'node', node, backup_type="full",
@@ -555,65 +448,29 @@ class BackupTest(ProbackupTest, unittest.TestCase):
             node, 'tblspace2',
             tblspc_path=tblspace2_old_path)
 
-        node.safe_psql(
-            "postgres",
-            "create table t_heap_lame tablespace some_lame_tablespace "
-            "as select 1 as id, md5(i::text) as text, "
-            "md5(repeat(i::text,10))::tsvector as tsvector "
-            "from generate_series(0,1000) i")
+        self.populate_t_heap(
+            node, 't_heap_lame', tablespace='some_lame_tablespace')
 
-        node.safe_psql(
-            "postgres",
-            "create table t_heap2 tablespace tblspace2 as select 1 as id, "
-            "md5(i::text) as text, "
-            "md5(repeat(i::text,10))::tsvector as tsvector "
-            "from generate_series(0,1000) i")
+        self.populate_t_heap(node, 't_heap2', tablespace='tblspace2')
 
         tblspace1_new_path = self.get_tblspace_path(node, 'tblspace1_new')
         tblspace2_new_path = self.get_tblspace_path(node, 'tblspace2_new')
 
-        node_restored = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node_restored'))
-        node_restored.cleanup()
+        # restore creates PGDATA by itself, no node is needed
+        restored_data_dir = os.path.join(
+            self.test_base, 'node_restored', 'data')
 
-        try:
-            self.restore_node(
-                backup_dir, 'node', node_restored,
-                options=[
-                    "-j", "4",
-                    "-T", "{0}={1}".format(
-                        tblspace1_old_path, tblspace1_new_path),
-                    "-T", "{0}={1}".format(
-                        tblspace2_old_path, tblspace2_new_path)])
-            # we should die here because exception is what we expect to happen
-            self.assertEqual(
-                1, 0,
-                "Expecting Error because tablespace mapping is incorrect"
-                "\n Output: {0} \n CMD: {1}".format(
-                    repr(self.output), self.cmd))
-        except ProbackupException as e:
-            self.assertTrue(
-                'ERROR: --tablespace-mapping option' in e.message and
-                'have an entry in tablespace_map file' in e.message,
-                '\n Unexpected Error Message: {0}\n CMD: {1}'.format(
-                    repr(e.message), self.cmd))
-
-        node.safe_psql(
-            "postgres",
-            "drop table t_heap_lame")
-
-        node.safe_psql(
-            "postgres",
-            "drop tablespace some_lame_tablespace")
+        self.pg_exec(node, "drop table t_heap_lame")
+        self.pg_exec(node, "drop tablespace some_lame_tablespace")
 
         self.backup_node(
             backup_dir, 'node', node, backup_type="delta",
             options=["-j", "4", "--stream"])
 
         self.restore_node(
-            backup_dir, 'node', node_restored,
+            backup_dir, 'node', data_dir=restored_data_dir,
             options=[
-                "-j", "4",
+                "-j", self.restore_jobs,
                 "-T", "{0}={1}".format(
                     tblspace1_old_path, tblspace1_new_path),
                 "-T", "{0}={1}".format(
@@ -623,145 +480,26 @@ class BackupTest(ProbackupTest, unittest.TestCase):
             pgdata = self.pgdata_content(node.data_dir)
 
         if self.paranoia:
-            pgdata_restored = self.pgdata_content(node_restored.data_dir)
+            pgdata_restored = self.pgdata_content(restored_data_dir)
             self.compare_pgdata(pgdata, pgdata_restored)
 
         # Clean after yourself
-        self.del_test_dir(module_name, fname)
-
-    # @unittest.skip("skip")
-    def test_tablespace_handling_1(self):
-        """
-        make node with tablespace A, take full backup, check that restore with
-        tablespace mapping of tablespace B will end with error
-        """
-        fname = self.id().split('.')[3]
-        node = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node'),
-            set_replication=True,
-            initdb_params=['--data-checksums'])
-
-        backup_dir = os.path.join(self.tmp_path, module_name, fname, 'backup')
-
-        self.init_pb(backup_dir)
-        self.add_instance(backup_dir, 'node', node)
-        node.slow_start()
-
-        tblspace1_old_path = self.get_tblspace_path(node, 'tblspace1_old')
-        tblspace2_old_path = self.get_tblspace_path(node, 'tblspace2_old')
-
-        tblspace_new_path = self.get_tblspace_path(node, 'tblspace_new')
-
-        self.create_tblspace_in_node(
-            node, 'tblspace1',
-            tblspc_path=tblspace1_old_path)
-
-        self.backup_node(
-            backup_dir, 'node', node, backup_type="full",
-            options=["-j", "4", "--stream"])
-
-        node_restored = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node_restored'))
-        node_restored.cleanup()
-
-        try:
-            self.restore_node(
-                backup_dir, 'node', node_restored,
-                options=[
-                    "-j", "4",
-                    "-T", "{0}={1}".format(
-                        tblspace2_old_path, tblspace_new_path)])
-            # we should die here because exception is what we expect to happen
-            self.assertEqual(
-                1, 0,
-                "Expecting Error because tablespace mapping is incorrect"
-                "\n Output: {0} \n CMD: {1}".format(
-                    repr(self.output), self.cmd))
-        except ProbackupException as e:
-            self.assertTrue(
-                'ERROR: --tablespace-mapping option' in e.message and
-                'have an entry in tablespace_map file' in e.message,
-                '\n Unexpected Error Message: {0}\n CMD: {1}'.format(
-                    repr(e.message), self.cmd))
-
-        # Clean after yourself
-        self.del_test_dir(module_name, fname)
-
-    # @unittest.skip("skip")
-    def test_tablespace_handling_2(self):
-        """
-        make node without tablespaces, take full backup, check that restore with
-        tablespace mapping will end with error
-        """
-        fname = self.id().split('.')[3]
-        node = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node'),
-            set_replication=True,
-            initdb_params=['--data-checksums'])
-
-        backup_dir = os.path.join(self.tmp_path, module_name, fname, 'backup')
-
-        self.init_pb(backup_dir)
-        self.add_instance(backup_dir, 'node', node)
-        node.slow_start()
-
-        tblspace1_old_path = self.get_tblspace_path(node, 'tblspace1_old')
-        tblspace_new_path = self.get_tblspace_path(node, 'tblspace_new')
-
-        self.backup_node(
-            backup_dir, 'node', node, backup_type="full",
-            options=["-j", "4", "--stream"])
-
-        node_restored = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node_restored'))
-        node_restored.cleanup()
-
-        try:
-            self.restore_node(
-                backup_dir, 'node', node_restored,
-                options=[
-                    "-j", "4",
-                    "-T", "{0}={1}".format(
-                        tblspace1_old_path, tblspace_new_path)])
-            # we should die here because exception is what we expect to happen
-            self.assertEqual(
-                1, 0,
-                "Expecting Error because tablespace mapping is incorrect"
-                "\n Output: {0} \n CMD: {1}".format(
-                    repr(self.output), self.cmd))
-        except ProbackupException as e:
-            self.assertTrue(
-                'ERROR: --tablespace-mapping option' in e.message and
-                'have an entry in tablespace_map file' in e.message,
-                '\n Unexpected Error Message: {0}\n CMD: {1}'.format(
-                    repr(e.message), self.cmd))
-
-        # Clean after yourself
-        self.del_test_dir(module_name, fname)
+        self.del_test_dir(module_name, self.fname)
 
     # @unittest.skip("skip")
+    @serial
     def test_drop_rel_during_backup_delta(self):
         """"""
-        fname = self.id().split('.')[3]
-        backup_dir = os.path.join(self.tmp_path, module_name, fname, 'backup')
-        node = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node'),
-            set_replication=True,
-            initdb_params=['--data-checksums'])
-
-        self.init_pb(backup_dir)
-        self.add_instance(backup_dir, 'node', node)
-        self.set_archiving(backup_dir, 'node', node)
-        node.slow_start()
+        node, backup_dir = self.make_env(
+            pg_options=no_durability_options,
+            set_replication=True)
 
-        node.safe_psql(
-            "postgres",
+        self.pg_exec(
+            node,
             "create table t_heap as select i"
             " as id from generate_series(0,100) i")
 
-        relative_path = node.safe_psql(
-            "postgres",
-            "select pg_relation_filepath('t_heap')").rstrip()
+        relative_path = self.get_relfilepath(node, 't_heap')
 
         absolute_path = os.path.join(node.data_dir, relative_path)
 
@@ -777,58 +515,43 @@ class BackupTest(ProbackupTest, unittest.TestCase):
         gdb.run_until_break()
 
         # REMOVE file
-        node.safe_psql(
-            "postgres",
-            "DROP TABLE t_heap")
-
-        node.safe_psql(
-            "postgres",
-            "CHECKPOINT")
+        self.pg_exec(node, "DROP TABLE t_heap")
+        self.pg_exec(node, "CHECKPOINT")
 
         # File removed, we can proceed with backup
         gdb.continue_execution_until_exit()
 
         pgdata = self.pgdata_content(node.data_dir)
 
-        with open(os.path.join(backup_dir, 'log', 'pg_probackup.log')) as f:
-            log_content = f.read()
-            self.assertTrue(
-                'LOG: File "{0}" is not found'.format(absolute_path) in log_content,
-                'File "{0}" should be deleted but it`s not'.format(absolute_path))
+        self.assert_log_contains(
+            os.path.join(backup_dir, 'log', 'pg_probackup.log'),
+            'LOG: File "{0}" is not found'.format(absolute_path),
+            msg='File "{0}" should be deleted but it`s not'.format(
+                absolute_path))
 
         node.cleanup()
-        self.restore_node(backup_dir, 'node', node, options=["-j", "4"])
+        self.restore_node(
+            backup_dir, 'node', node, options=["-j", self.restore_jobs])
 
         # Physical comparison
         pgdata_restored = self.pgdata_content(node.data_dir)
         self.compare_pgdata(pgdata, pgdata_restored)
 
         # Clean after yourself
-        self.del_test_dir(module_name, fname)
+        self.del_test_dir(module_name, self.fname)
 
     # @unittest.skip("skip")
+    @serial
     def test_drop_rel_during_backup_page(self):
         """"""
-        fname = self.id().split('.')[3]
-        backup_dir = os.path.join(self.tmp_path, module_name, fname, 'backup')
-        node = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node'),
-            set_replication=True,
-            initdb_params=['--data-checksums'])
-
-        self.init_pb(backup_dir)
-        self.add_instance(backup_dir, 'node', node)
-        self.set_archiving(backup_dir, 'node', node)
-        node.slow_start()
+        node, backup_dir = self.make_env(set_replication=True)
 
-        node.safe_psql(
-            "postgres",
+        self.pg_exec(
+            node,
             "create table t_heap as select i"
             " as id from generate_series(0,100) i")
 
-        relative_path = node.safe_psql(
-            "postgres",
-            "select pg_relation_filepath('t_heap')").rstrip()
+        relative_path = self.get_relfilepath(node, 't_heap')
 
         absolute_path = os.path.join(node.data_dir, relative_path)
 
@@ -851,47 +574,37 @@ class BackupTest(ProbackupTest, unittest.TestCase):
 
         pgdata = self.pgdata_content(node.data_dir)
 
-        with open(os.path.join(backup_dir, 'log', 'pg_probackup.log')) as f:
-            log_content = f.read()
-            self.assertTrue(
-                'LOG: File "{0}" is not found'.format(absolute_path) in log_content,
-                'File "{0}" should be deleted but it`s not'.format(absolute_path))
+        self.assert_log_contains(
+            os.path.join(backup_dir, 'log', 'pg_probackup.log'),
+            'LOG: File "{0}" is not found'.format(absolute_path),
+            msg='File "{0}" should be deleted but it`s not'.format(
+                absolute_path))
 
         node.cleanup()
-        self.restore_node(backup_dir, 'node', node, options=["-j", "4"])
+        self.restore_node(
+            backup_dir, 'node', node, options=["-j", self.restore_jobs])
 
         # Physical comparison
         pgdata_restored = self.pgdata_content(node.data_dir)
         self.compare_pgdata(pgdata, pgdata_restored)
 
         # Clean after yourself
-        self.del_test_dir(module_name, fname)
+        self.del_test_dir(module_name, self.fname)
 
     # @unittest.skip("skip")
+    @serial
     def test_drop_rel_during_backup_ptrack(self):
         """"""
-        fname = self.id().split('.')[3]
-        backup_dir = os.path.join(self.tmp_path, module_name, fname, 'backup')
-        node = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node'),
-            set_replication=True,
-            initdb_params=['--data-checksums'],
-            pg_options={
-                'ptrack_enable': 'on'})
+        node, backup_dir = self.make_env(
+            pg_options={'ptrack_enable': 'on'},
+            set_replication=True)
 
-        self.init_pb(backup_dir)
-        self.add_instance(backup_dir, 'node', node)
-        self.set_archiving(backup_dir, 'node', node)
-        node.slow_start()
-
-        node.safe_psql(
-            "postgres",
+        self.pg_exec(
+            node,
             "create table t_heap as select i"
             " as id from generate_series(0,100) i")
 
-        relative_path = node.safe_psql(
-            "postgres",
-            "select pg_relation_filepath('t_heap')").rstrip()
+        relative_path = self.get_relfilepath(node, 't_heap')
 
         absolute_path = os.path.join(node.data_dir, relative_path)
 
@@ -914,42 +627,34 @@ class BackupTest(ProbackupTest, unittest.TestCase):
 
         pgdata = self.pgdata_content(node.data_dir)
 
-        with open(os.path.join(backup_dir, 'log', 'pg_probackup.log')) as f:
-            log_content = f.read()
-            self.assertTrue(
-                'LOG: File "{0}" is not found'.format(absolute_path) in log_content,
-                'File "{0}" should be deleted but it`s not'.format(absolute_path))
+        self.assert_log_contains(
+            os.path.join(backup_dir, 'log', 'pg_probackup.log'),
+            'LOG: File "{0}" is not found'.format(absolute_path),
+            msg='File "{0}" should be deleted but it`s not'.format(
+                absolute_path))
 
         node.cleanup()
-        self.restore_node(backup_dir, 'node', node, options=["-j", "4"])
+        self.restore_node(
+            backup_dir, 'node', node, options=["-j", self.restore_jobs])
 
         # Physical comparison
         pgdata_restored = self.pgdata_content(node.data_dir)
         self.compare_pgdata(pgdata, pgdata_restored)
 
         # Clean after yourself
-        self.del_test_dir(module_name, fname)
+        self.del_test_dir(module_name, self.fname)
 
     # @unittest.skip("skip")
     def test_persistent_slot_for_stream_backup(self):
         """"""
-        fname = self.id().split('.')[3]
-        backup_dir = os.path.join(self.tmp_path, module_name, fname, 'backup')
-        node = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node'),
-            set_replication=True,
-            initdb_params=['--data-checksums'],
+        node, backup_dir = self.make_env(
             pg_options={
-                'max_wal_size': '40MB'})
-
-        self.init_pb(backup_dir)
-        self.add_instance(backup_dir, 'node', node)
-        self.set_archiving(backup_dir, 'node', node)
-        node.slow_start()
+                'max_wal_size': '40MB'},
+            set_replication=True,
+            archiving=False)
 
-        node.safe_psql(
-            "postgres",
-            "SELECT pg_create_physical_replication_slot('slot_1')")
+        self.pg_exec(
+            node, "SELECT pg_create_physical_replication_slot('slot_1')")
 
         # FULL backup
         self.backup_node(
@@ -962,24 +667,16 @@ class BackupTest(ProbackupTest, unittest.TestCase):
             options=['--stream', '--slot=slot_1'])
 
         # Clean after yourself
-        self.del_test_dir(module_name, fname)
+        self.del_test_dir(module_name, self.fname)
 
     # @unittest.skip("skip")
     def test_basic_temp_slot_for_stream_backup(self):
         """"""
-        fname = self.id().split('.')[3]
-        backup_dir = os.path.join(self.tmp_path, module_name, fname, 'backup')
-        node = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node'),
-            set_replication=True,
-            initdb_params=['--data-checksums'],
+        node, backup_dir = self.make_env(
             pg_options={
-                'max_wal_size': '40MB'})
-
-        self.init_pb(backup_dir)
-        self.add_instance(backup_dir, 'node', node)
-        self.set_archiving(backup_dir, 'node', node)
-        node.slow_start()
+                'max_wal_size': '40MB'},
+            set_replication=True,
+            archiving=False)
 
         # FULL backup
         self.backup_node(
@@ -997,42 +694,31 @@ class BackupTest(ProbackupTest, unittest.TestCase):
             options=['--stream', '--slot=slot_1', '--temp-slot'])
 
         # Clean after yourself
-        self.del_test_dir(module_name, fname)
+        self.del_test_dir(module_name, self.fname)
 
     # @unittest.skip("skip")
+    @serial
     def test_backup_concurrent_drop_table(self):
         """"""
-        fname = self.id().split('.')[3]
-        backup_dir = os.path.join(self.tmp_path, module_name, fname, 'backup')
-        node = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node'),
+        node, backup_dir = self.make_env(
             set_replication=True,
-            initdb_params=['--data-checksums'])
-
-        self.init_pb(backup_dir)
-        self.add_instance(backup_dir, 'node', node)
-        self.set_archiving(backup_dir, 'node', node)
-        node.slow_start()
+            archiving=False,
+            pgbench_scale=1)
 
-        node.pgbench_init(scale=1)
-
-        # FULL backup
+        # FULL backup, compression is only to cover compressed
+        # data file code path, so use the cheapest level
         gdb = self.backup_node(
             backup_dir, 'node', node,
-            options=['--stream', '--compress'],
+            options=['--stream', '--compress', '--compress-level=1'],
             gdb=True)
 
         gdb.set_breakpoint('backup_data_file')
         gdb.run_until_break()
 
-        node.safe_psql(
-            'postgres',
-            'DROP TABLE pgbench_accounts')
+        self.pg_exec(node, 'DROP TABLE pgbench_accounts')
 
         # do checkpoint to guarantee filenode removal
-        node.safe_psql(
-            'postgres',
-            'CHECKPOINT')
+        self.pg_exec(node, 'CHECKPOINT')
 
         gdb.remove_all_breakpoints()
         gdb.continue_execution_until_exit()
@@ -1042,7 +728,7 @@ class BackupTest(ProbackupTest, unittest.TestCase):
         self.assertEqual(show_backup['status'], "OK")
 
         # Clean after yourself
-        self.del_test_dir(module_name, fname)
+        self.del_test_dir(module_name, self.fname)
 
     # @unittest.skip("skip")
     def test_pg_11_adjusted_wal_segment_size(self):
@@ -1050,30 +736,26 @@ class BackupTest(ProbackupTest, unittest.TestCase):
         if self.pg_config_version < self.version_to_num('11.0'):
             return unittest.skip('You need PostgreSQL >= 11 for this test')
 
-        fname = self.id().split('.')[3]
-        backup_dir = os.path.join(self.tmp_path, module_name, fname, 'backup')
-        node = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node'),
-            set_replication=True,
+        node, backup_dir = self.make_env(
             initdb_params=[
                 '--data-checksums',
                 '--wal-segsize=64'],
             pg_options={
                 'min_wal_size': '128MB',
-                'autovacuum': 'off'})
-
-        self.init_pb(backup_dir)
-        self.add_instance(backup_dir, 'node', node)
-        self.set_archiving(backup_dir, 'node', node)
-        node.slow_start()
+                'autovacuum': 'off'},
+            set_replication=True)
 
         node.pgbench_init(scale=5)
 
+        # Load between backups is limited by number of transactions,
+        # not by time, so fast hosts don't wait for nothing
+        pgbench_options = ['-t', '500', '-c', '2']
+
         # FULL STREAM backup
         self.backup_node(
             backup_dir, 'node', node, options=['--stream'])
 
-        pgbench = node.pgbench(options=['-T', '5', '-c', '2'])
+        pgbench = node.pgbench(options=pgbench_options)
         pgbench.wait()
 
         # PAGE STREAM backup
@@ -1081,7 +763,7 @@ class BackupTest(ProbackupTest, unittest.TestCase):
             backup_dir, 'node', node,
             backup_type='page', options=['--stream'])
 
-        pgbench = node.pgbench(options=['-T', '5', '-c', '2'])
+        pgbench = node.pgbench(options=pgbench_options)
         pgbench.wait()
 
         # DELTA STREAM backup
@@ -1089,19 +771,19 @@ class BackupTest(ProbackupTest, unittest.TestCase):
             backup_dir, 'node', node,
             backup_type='delta', options=['--stream'])
 
-        pgbench = node.pgbench(options=['-T', '5', '-c', '2'])
+        pgbench = node.pgbench(options=pgbench_options)
         pgbench.wait()
 
         # FULL ARCHIVE backup
         self.backup_node(backup_dir, 'node', node)
 
-        pgbench = node.pgbench(options=['-T', '5', '-c', '2'])
+        pgbench = node.pgbench(options=pgbench_options)
         pgbench.wait()
 
         # PAGE ARCHIVE backup
         self.backup_node(backup_dir, 'node', node, backup_type='page')
 
-        pgbench = node.pgbench(options=['-T', '5', '-c', '2'])
+        pgbench = node.pgbench(options=pgbench_options)
         pgbench.wait()
 
         # DELTA ARCHIVE backup
@@ -1125,141 +807,60 @@ class BackupTest(ProbackupTest, unittest.TestCase):
         # restore
         node.cleanup()
         self.restore_node(
-            backup_dir, 'node', node, backup_id=backup_id)
+            backup_dir, 'node', node, backup_id=backup_id,
+            options=["-j", self.restore_jobs])
 
         pgdata_restored = self.pgdata_content(node.data_dir)
         self.compare_pgdata(pgdata, pgdata_restored)
 
         # Clean after yourself
-        self.del_test_dir(module_name, fname)
+        self.del_test_dir(module_name, self.fname)
 
     # @unittest.skip("skip")
-    def test_sigint_handling(self):
-        """"""
-        fname = self.id().split('.')[3]
-        backup_dir = os.path.join(self.tmp_path, module_name, fname, 'backup')
-        node = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node'),
-            set_replication=True,
-            initdb_params=['--data-checksums'])
-
-        self.init_pb(backup_dir)
-        self.add_instance(backup_dir, 'node', node)
-        node.slow_start()
-
-        # FULL backup
-        gdb = self.backup_node(
-            backup_dir, 'node', node, gdb=True,
-            options=['--stream', '--log-level-file=verbose'])
-
-        gdb.set_breakpoint('copy_file')
-        gdb.run_until_break()
-
-        gdb.continue_execution_until_break(20)
-        gdb.remove_all_breakpoints()
-
-        gdb._execute('signal SIGINT')
-        gdb.continue_execution_until_error()
-
-        backup_id = self.show_pb(backup_dir, 'node')[0]['id']
-
-        self.assertEqual(
-            'ERROR',
-            self.show_pb(backup_dir, 'node', backup_id)['status'],
-            'Backup STATUS should be "ERROR"')
-
-        # Clean after yourself
-        self.del_test_dir(module_name, fname)
-
-    # @unittest.skip("skip")
-    def test_sigterm_handling(self):
-        """"""
-        fname = self.id().split('.')[3]
-        backup_dir = os.path.join(self.tmp_path, module_name, fname, 'backup')
-        node = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node'),
+    @serial
+    def test_signal_handling(self):
+        """
+        backup interrupted by SIGINT, SIGTERM or SIGQUIT
+        must end with ERROR status
+        """
+        node, backup_dir = self.make_env(
             set_replication=True,
-            initdb_params=['--data-checksums'])
-
-        self.init_pb(backup_dir)
-        self.add_instance(backup_dir, 'node', node)
-        node.slow_start()
-
-        # FULL backup
-        gdb = self.backup_node(
-            backup_dir, 'node', node, gdb=True,
-            options=['--stream', '--log-level-file=verbose'])
-
-        gdb.set_breakpoint('copy_file')
-        gdb.run_until_break()
-
-        gdb.continue_execution_until_break(20)
-        gdb.remove_all_breakpoints()
-
-        gdb._execute('signal SIGTERM')
-        gdb.continue_execution_until_error()
-
-        backup_id = self.show_pb(backup_dir, 'node')[0]['id']
-
-        self.assertEqual(
-            'ERROR',
-            self.show_pb(backup_dir, 'node', backup_id)['status'],
-            'Backup STATUS should be "ERROR"')
+            archiving=False,
+            pooled=True)
+
+        backups_count = 0
+        for signal in ['SIGINT', 'SIGTERM', 'SIGQUIT']:
+            with self.subTest(signal=signal):
+                # FULL backup
+                gdb = self.backup_node(
+                    backup_dir, 'node', node, gdb=True,
+                    options=['--stream', '--log-level-file=verbose'])
+
+                # stop on 21st call of copy_file()
+                gdb.set_breakpoint('copy_file', ignore=20, temporary=True)
+                gdb.run_until_break()
+
+                gdb._execute('signal ' + signal)
+                gdb.continue_execution_until_error()
+
+                # backups of previous signals are listed first
+                backups = self.show_pb(backup_dir, 'node')
+                self.assertEqual(len(backups), backups_count + 1)
+                backups_count = len(backups)
+                self.assertEqual(
+                    'ERROR', backups[-1]['status'],
+                    'Backup STATUS should be "ERROR"')
 
         # Clean after yourself
-        self.del_test_dir(module_name, fname)
-
-    # @unittest.skip("skip")
-    def test_sigquit_handling(self):
-        """"""
-        fname = self.id().split('.')[3]
-        backup_dir = os.path.join(self.tmp_path, module_name, fname, 'backup')
-        node = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node'),
-            set_replication=True,
-            initdb_params=['--data-checksums'])
-
-        self.init_pb(backup_dir)
-        self.add_instance(backup_dir, 'node', node)
-        node.slow_start()
-
-        # FULL backup
-        gdb = self.backup_node(
-            backup_dir, 'node', node, gdb=True,
-            options=['--stream', '--log-level-file=verbose'])
-
-        gdb.set_breakpoint('copy_file')
-        gdb.run_until_break()
-
-        gdb.continue_execution_until_break(20)
-        gdb.remove_all_breakpoints()
-
-        gdb._execute('signal SIGQUIT')
-        gdb.continue_execution_until_error()
-
-        backup_id = self.show_pb(backup_dir, 'node')[0]['id']
-
-        self.assertEqual(
-            'ERROR',
-            self.show_pb(backup_dir, 'node', backup_id)['status'],
-            'Backup STATUS should be "ERROR"')
-
-        # Clean after yourself
-        self.del_test_dir(module_name, fname)
+        self.del_test_dir(module_name, self.fname)
 
     # @unittest.skip("skip")
     def test_drop_table(self):
         """"""
-        fname = self.id().split('.')[3]
-        backup_dir = os.path.join(self.tmp_path, module_name, fname, 'backup')
-        node = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node'),
+        node, backup_dir = self.make_env(
             set_replication=True,
-            initdb_params=['--data-checksums'])
-
-        self.init_pb(backup_dir)
-        self.add_instance(backup_dir, 'node', node)
-        node.slow_start()
+            archiving=False,
+            pooled=True)
 
         connect_1 = node.connect("postgres")
         connect_1.execute(
@@ -1280,88 +881,243 @@ class BackupTest(ProbackupTest, unittest.TestCase):
             backup_dir, 'node', node, options=['--stream'])
 
         # Clean after yourself
-        self.del_test_dir(module_name, fname)
+        self.del_test_dir(module_name, self.fname)
+
+
+class BackupErrorsTest(unittest.TestCase):
+    """
+    Tests, which only check that invalid command ends with error,
+    share one running node and backup catalog with instances:
+    'node' - without backups,
+    'node_ptrack' - without backups, for its own node with ptrack,
+    'node_full' - with FULL backup of node without tablespaces,
+    'node_tblspc' - with FULL backup of node with tablespace 'tblspace1',
+    'node_perm_dir', 'node_perm_file' - for backups failing because of
+    missing permissions, one per test, as every failed backup leaves
+    its directory in catalog and may collide with the next one by ID
+    """
+    pb = None
+    node = None
+
+    @classmethod
+    def setUpClass(cls):
+
+        super(BackupErrorsTest, cls).setUpClass()
+
+        cls.pb = ProbackupTest()
+        cls.backup_dir = os.path.join(
+            cls.pb.tmp_path, module_name, cls.__name__, 'backup')
+        cls.restored_data_dir = os.path.join(
+            cls.pb.tmp_path, module_name, cls.__name__, 'node_restored')
+
+        cls.node = cls.pb.make_simple_node(
+            base_dir=os.path.join(module_name, cls.__name__, 'node'),
+            set_replication=True,
+            initdb_params=['--data-checksums'],
+            template=cls.pb.get_initdb_template(['--data-checksums']))
+
+        cls.pb.init_pb(cls.backup_dir)
+        cls.pb.add_instance(cls.backup_dir, 'node', cls.node)
+        cls.pb.add_instance(cls.backup_dir, 'node_full', cls.node)
+        cls.pb.add_instance(cls.backup_dir, 'node_tblspc', cls.node)
+        cls.pb.add_instance(cls.backup_dir, 'node_perm_dir', cls.node)
+        cls.pb.add_instance(cls.backup_dir, 'node_perm_file', cls.node)
+        cls.pb.set_archiving(cls.backup_dir, 'node', cls.node)
+        cls.node.slow_start()
+
+        # tearDownClass() is not called if setUpClass() fails,
+        # so don't leave the node running
+        try:
+            cls.pb.backup_node(
+                cls.backup_dir, 'node_full', cls.node, backup_type="full",
+                options=["-j", "4", "--stream"])
+
+            cls.tblspace1_old_path = cls.pb.get_tblspace_path(
+                cls.node, 'tblspace1_old')
+            cls.tblspace2_old_path = cls.pb.get_tblspace_path(
+                cls.node, 'tblspace2_old')
+            cls.tblspace_new_path = cls.pb.get_tblspace_path(
+                cls.node, 'tblspace_new')
+            cls.tblspace2_new_path = cls.pb.get_tblspace_path(
+                cls.node, 'tblspace2_new')
+
+            os.makedirs(cls.tblspace1_old_path)
+            cls.node.safe_psql(
+                "postgres",
+                "CREATE TABLESPACE tblspace1 LOCATION '{0}'".format(
+                    cls.tblspace1_old_path))
+
+            cls.pb.backup_node(
+                cls.backup_dir, 'node_tblspc', cls.node, backup_type="full",
+                options=["-j", "4", "--stream"])
+        except Exception:
+            cls.node.stop()
+            raise
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.node.stop()
+        cls.pb.del_test_dir(module_name, cls.__name__)
 
     # @unittest.skip("skip")
-    def test_basic_missing_file_permissions(self):
-        """"""
-        fname = self.id().split('.')[3]
-        backup_dir = os.path.join(self.tmp_path, module_name, fname, 'backup')
-        node = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node'),
-            set_replication=True,
-            initdb_params=['--data-checksums'])
+    def test_incremental_backup_without_full(self):
+        """page-level backup without validated full backup"""
+        try:
+            self.pb.backup_node(
+                self.backup_dir, 'node', self.node, backup_type="page")
+            # we should die here because exception is what we expect to happen
+            self.assertEqual(
+                1, 0,
+                "Expecting Error because page backup should not be possible "
+                "without valid full backup.\n Output: {0} \n CMD: {1}".format(
+                    repr(self.pb.output), self.pb.cmd))
+        except ProbackupException as e:
+            self.assertIn(
+                "ERROR: Valid backup on current timeline is not found. "
+                "Create new FULL backup before an incremental one.",
+                e.message,
+                "\n Unexpected Error Message: {0}\n CMD: {1}".format(
+                    repr(e.message), self.pb.cmd))
+
+        self.assertEqual(
+            self.pb.show_pb(self.backup_dir, 'node')[0]['status'],
+            "ERROR")
 
-        self.init_pb(backup_dir)
-        self.add_instance(backup_dir, 'node', node)
+    # @unittest.skip("skip")
+    def test_incremental_ptrack_backup_without_full(self):
+        """ptrack backup without validated full backup"""
+        # only this test needs ptrack, so it has its own node,
+        # the shared one runs on unpatched server too
+        node = self.pb.make_simple_node(
+            base_dir=os.path.join(
+                module_name, self.__class__.__name__, 'node_ptrack'),
+            initdb_params=['--data-checksums'],
+            template=self.pb.get_initdb_template(['--data-checksums']),
+            pg_options={'ptrack_enable': 'on'})
+
+        self.pb.add_instance(self.backup_dir, 'node_ptrack', node)
+        self.pb.set_archiving(self.backup_dir, 'node_ptrack', node)
         node.slow_start()
+        self.addCleanup(node.stop)
 
-        relative_path = node.safe_psql(
-            "postgres",
-            "select pg_relation_filepath('pg_class')").rstrip()
+        try:
+            self.pb.backup_node(
+                self.backup_dir, 'node_ptrack', node, backup_type="ptrack")
+            # we should die here because exception is what we expect to happen
+            self.assertEqual(
+                1, 0,
+                "Expecting Error because ptrack backup should not be possible "
+                "without valid full backup.\n Output: {0} \n CMD: {1}".format(
+                    repr(self.pb.output), self.pb.cmd))
+        except ProbackupException as e:
+            self.assertIn(
+                "ERROR: Valid backup on current timeline is not found. "
+                "Create new FULL backup before an incremental one.",
+                e.message,
+                "\n Unexpected Error Message: {0}\n CMD: {1}".format(
+                    repr(e.message), self.pb.cmd))
+
+        self.assertEqual(
+            self.pb.show_pb(self.backup_dir, 'node_ptrack')[0]['status'],
+            "ERROR")
+
+    # @unittest.skip("skip")
+    def test_tablespace_mapping_errors(self):
+        """
+        check that restore with tablespace mapping of tablespace,
+        which is absent in backup, will end with error
+        """
+        cases = [
+            # backup with tablespace A, mapping of tablespace B
+            ('node_tblspc', [
+                (self.tblspace2_old_path, self.tblspace_new_path)]),
+            # backup without tablespaces, mapping of tablespace A
+            ('node_full', [
+                (self.tblspace1_old_path, self.tblspace_new_path)]),
+            # backup without tablespaces, mapping of tablespaces A and B
+            ('node_full', [
+                (self.tblspace1_old_path, self.tblspace_new_path),
+                (self.tblspace2_old_path, self.tblspace2_new_path)]),
+            ]
+
+        for instance, mapping in cases:
+            with self.subTest(instance=instance, mapping=mapping):
+                options = ["-j", "4"]
+                for old_path, new_path in mapping:
+                    options += ["-T", "{0}={1}".format(old_path, new_path)]
+
+                try:
+                    self.pb.restore_node(
+                        self.backup_dir, instance,
+                        data_dir=self.restored_data_dir,
+                        options=options)
+                    # we should die here because exception
+                    # is what we expect to happen
+                    self.assertEqual(
+                        1, 0,
+                        "Expecting Error because tablespace mapping "
+                        "is incorrect\n Output: {0} \n CMD: {1}".format(
+                            repr(self.pb.output), self.pb.cmd))
+                except ProbackupException as e:
+                    self.assertTrue(
+                        'ERROR: --tablespace-mapping option' in e.message and
+                        'have an entry in tablespace_map file' in e.message,
+                        '\n Unexpected Error Message: {0}\n CMD: {1}'.format(
+                            repr(e.message), self.pb.cmd))
+
+    def revoke_permissions(self, path):
+        """ chmod 000 'path', original mode is restored after test """
+        self.addCleanup(
+            os.chmod, path, stat.S_IMODE(os.stat(path).st_mode))
+        os.chmod(path, 0o000)
 
-        full_path = os.path.join(node.data_dir, relative_path)
+    # @unittest.skip("skip")
+    def test_basic_missing_file_permissions(self):
+        """"""
+        relative_path = self.pb.pg_exec(
+            self.node, "select pg_relation_filepath('pg_class')", fetch=True)
 
-        os.chmod(full_path, 000)
+        self.revoke_permissions(
+            os.path.join(self.node.data_dir, relative_path))
 
         try:
             # FULL backup
-            self.backup_node(
-                backup_dir, 'node', node, options=['--stream'])
+            self.pb.backup_node(
+                self.backup_dir, 'node_perm_file', self.node,
+                options=['--stream'])
             # we should die here because exception is what we expect to happen
             self.assertEqual(
                 1, 0,
                 "Expecting Error because of missing permissions"
                 "\n Output: {0} \n CMD: {1}".format(
-                    repr(self.output), self.cmd))
+                    repr(self.pb.output), self.pb.cmd))
         except ProbackupException as e:
             self.assertIn(
                 'ERROR: cannot open file',
                 e.message,
                 '\n Unexpected Error Message: {0}\n CMD: {1}'.format(
-                    repr(e.message), self.cmd))
-
-        os.chmod(full_path, 700)
-
-        # Clean after yourself
-        self.del_test_dir(module_name, fname)
+                    repr(e.message), self.pb.cmd))
 
     # @unittest.skip("skip")
     def test_basic_missing_dir_permissions(self):
         """"""
-        fname = self.id().split('.')[3]
-        backup_dir = os.path.join(self.tmp_path, module_name, fname, 'backup')
-        node = self.make_simple_node(
-            base_dir=os.path.join(module_name, fname, 'node'),
-            set_replication=True,
-            initdb_params=['--data-checksums'])
-
-        self.init_pb(backup_dir)
-        self.add_instance(backup_dir, 'node', node)
-        node.slow_start()
-
-        full_path = os.path.join(node.data_dir, 'pg_twophase')
-
-        os.chmod(full_path, 000)
+        self.revoke_permissions(
+            os.path.join(self.node.data_dir, 'pg_twophase'))
 
         try:
             # FULL backup
-            self.backup_node(
-                backup_dir, 'node', node, options=['--stream'])
+            self.pb.backup_node(
+                self.backup_dir, 'node_perm_dir', self.node,
+                options=['--stream'])
             # we should die here because exception is what we expect to happen
             self.assertEqual(
                 1, 0,
                 "Expecting Error because of missing permissions"
                 "\n Output: {0} \n CMD: {1}".format(
-                    repr(self.output), self.cmd))
+                    repr(self.pb.output), self.pb.cmd))
         except ProbackupException as e:
             self.assertIn(
                 'ERROR: Cannot open directory',
                 e.message,
                 '\n Unexpected Error Message: {0}\n CMD: {1}'.format(
-                    repr(e.message), self.cmd))
-
-        os.chmod(full_path, 700)
-
-        # Clean after yourself
-        self.del_test_dir(module_name, fname)
+                    repr(e.message), self.pb.cmd))
@@ -0,0 +1,27 @@
+import pytest
+
+
+pytest_plugins = ['pytester']
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers',
+        'serial: test is grouped onto one xdist worker with other serial tests')
+
+
+# xdist computes the group of every item in its own
+# pytest_collection_modifyitems(), so the marker has to be added before it
+@pytest.hookimpl(tryfirst=True)
+def pytest_collection_modifyitems(config, items):
+    # Tests marked as serial, either via pytest marker or via
+    # helpers.ptrack_helpers.serial decorator, are put in the same
+    # xdist group, so with '--dist=loadgroup' they are executed
+    # one after another by a single worker. Other workers keep
+    # running their tests in parallel with them.
+    for item in items:
+        if (
+            item.get_closest_marker('serial') or
+            getattr(item.obj, 'serial', False)
+        ):
+            item.add_marker(pytest.mark.xdist_group('serial'))
@@ -1119,11 +1119,10 @@ class DeltaTest(ProbackupTest, unittest.TestCase):
             options=["-j", "4", "--stream", '--log-level-file=verbose'])
 
         # open log file and check
-        with open(os.path.join(backup_dir, 'log', 'pg_probackup.log')) as f:
-            log_content = f.read()
-            self.assertIn('block 1, try to fetch via SQL', log_content)
-            self.assertIn('SELECT pg_catalog.pg_ptrack_get_block', log_content)
-            f.close
+        self.assert_log_contains(
+            os.path.join(backup_dir, 'log', 'pg_probackup.log'),
+            'block 1, try to fetch via SQL',
+            'SELECT pg_catalog.pg_ptrack_get_block')
 
         self.assertTrue(
             self.show_pb(backup_dir, 'node')[1]['status'] == 'OK',
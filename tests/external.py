@@ -1742,7 +1742,7 @@ class ExternalTest(ProbackupTest, unittest.TestCase):
         # create symlink to directory in external directory
         src_file = os.path.join(symlinked_dir, 'postgresql.conf')
         os.mkdir(external_dir)
-        os.chmod(external_dir, 0700)
+        os.chmod(external_dir, 0o700)
         os.symlink(src_file, file_in_external_dir)
 
         # FULL backup with external directories
@@ -2120,7 +2120,7 @@ class ExternalTest(ProbackupTest, unittest.TestCase):
         # create empty file in external directory
         # open(os.path.join(external_dir, 'file'), 'a').close()
         os.mkdir(external_dir)
-        os.chmod(external_dir, 0700)
+        os.chmod(external_dir, 0o700)
         with open(os.path.join(external_dir, 'file'), 'w+') as f:
             f.close()
 
@@ -2186,7 +2186,7 @@ class ExternalTest(ProbackupTest, unittest.TestCase):
         # create empty file in external directory
         # open(os.path.join(external_dir, 'file'), 'a').close()
         os.mkdir(external_dir)
-        os.chmod(external_dir, 0700)
+        os.chmod(external_dir, 0o700)
         with open(os.path.join(external_dir, 'file'), 'w+') as f:
             f.close()
 
@@ -2255,12 +2255,12 @@ class ExternalTest(ProbackupTest, unittest.TestCase):
 
         # create empty file in external directory
         os.mkdir(external_dir_1)
-        os.chmod(external_dir_1, 0700)
+        os.chmod(external_dir_1, 0o700)
         with open(os.path.join(external_dir_1, 'fileA'), 'w+') as f:
             f.close()
 
         os.mkdir(external_dir_2)
-        os.chmod(external_dir_2, 0700)
+        os.chmod(external_dir_2, 0o700)
         with open(os.path.join(external_dir_2, 'fileZ'), 'w+') as f:
             f.close()
 
@@ -2337,12 +2337,12 @@ class ExternalTest(ProbackupTest, unittest.TestCase):
 
         # create empty file in external directory
         os.mkdir(external_dir_1)
-        os.chmod(external_dir_1, 0700)
+        os.chmod(external_dir_1, 0o700)
         with open(os.path.join(external_dir_1, 'fileA'), 'w+') as f:
             f.close()
 
         os.mkdir(external_dir_2)
-        os.chmod(external_dir_2, 0700)
+        os.chmod(external_dir_2, 0o700)
         with open(os.path.join(external_dir_2, 'fileZ'), 'w+') as f:
             f.close()
 
@@ -1,17 +1,29 @@
 # you need os for unittest to work
 import os
+import io
+import atexit
+import functools
 from sys import exit, argv, version_info
 import subprocess
 import shutil
 import six
 import testgres
 import hashlib
+import mmap
+import random
 import re
 import getpass
 import select
+import socket
 from time import sleep
 import re
 import json
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
 
 idx_ptrack = {
     't_heap': {
@@ -59,6 +71,16 @@ idx_ptrack = {
     }
 }
 
+# Rows of "create table t_heap as select 1 as id, md5(i::text) as text,
+# md5(repeat(i::text,10))::tsvector as tsvector
+# from generate_series(0,1000) i" in COPY text format,
+# see ProbackupTest.populate_t_heap()
+t_heap_payload = ''.join(
+    '1\t{0}\t{1}\n'.format(
+        hashlib.md5(str(i).encode('utf-8')).hexdigest(),
+        hashlib.md5((str(i) * 10).encode('utf-8')).hexdigest())
+    for i in range(1001)).encode('utf-8')
+
 warning = """
 Wrong splint in show_pb
 Original Header:
@@ -86,6 +108,188 @@ def dir_files(base_dir):
     return out_list
 
 
+def find_files_by_name(base_dir, name):
+    """
+    Return list of paths to files named 'name' under base_dir.
+    Unlike os.walk(), scandir() gives file type without extra stat() calls.
+    """
+    files = []
+    for entry in os.scandir(base_dir):
+        if entry.is_dir(follow_symlinks=False):
+            files += find_files_by_name(entry.path, name)
+        elif entry.name == name:
+            files.append(entry.path)
+    return files
+
+
+def serial(func):
+    """
+    Mark test to be grouped onto one pytest-xdist worker together
+    with other serial tests, e.g. because it is driven by gdb.
+    Tests on other workers still run in parallel. See conftest.py.
+    """
+    func.serial = True
+    return func
+
+
+# next port to try in the range of current pytest-xdist worker
+xdist_port_offset = 0
+
+# initdb'ed PGDATA templates, built once per process
+initdb_templates = {}
+
+# files already read into page cache, see preload_file()
+preloaded_files = set()
+
+
+def get_xdist_worker_port():
+    """
+    Return free port from the range reserved for current
+    pytest-xdist worker, or None if tests are run without xdist.
+    Ports are handed out round-robin, so nodes created by
+    the same test never get the same port.
+    """
+    global xdist_port_offset
+
+    worker = os.environ.get('PYTEST_XDIST_WORKER')
+    if not worker:
+        return None
+
+    port_base = 15432 + int(worker[2:]) * 100
+    for i in range(100):
+        port = port_base + xdist_port_offset
+        xdist_port_offset = (xdist_port_offset + 1) % 100
+
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            s.bind(('127.0.0.1', port))
+        except socket.error:
+            continue
+        finally:
+            s.close()
+        return port
+
+    # let testgres choose port by itself
+    return None
+
+
+def scan_files(path, dirs_to_ignore):
+    """
+    Yield (root, name) for every file under 'path', symlinks
+    (e.g. tablespaces in pg_tblspc) are followed like os.walk() with
+    followlinks=True does. os.scandir() gets file type from directory
+    entry, so no stat() is needed for every file.
+    """
+    subdirs = []
+    for entry in os.scandir(path):
+        if entry.is_dir():
+            if entry.name not in dirs_to_ignore:
+                subdirs.append(entry.path)
+        else:
+            yield path, entry.name
+
+    for subdir in subdirs:
+        for item in scan_files(subdir, dirs_to_ignore):
+            yield item
+
+
+def hash_file(path, hash_func, per_page=False):
+    """
+    Read file once in 1MB chunks, return its hash and, if 'per_page'
+    is True, dict {page number: hash of page} of 8KB pages.
+    """
+    file_hash = hash_func()
+    page_hashes = {}
+    page = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(128 * 8192)
+            if not chunk:
+                break
+            file_hash.update(chunk)
+            if per_page:
+                view = memoryview(chunk)
+                for offset in range(0, len(chunk), 8192):
+                    page_hashes[page] = hash_func(
+                        view[offset:offset + 8192]).hexdigest()
+                    page += 1
+
+    return file_hash.hexdigest(), page_hashes
+
+
+def preload_file(path):
+    """
+    Ask OS to read file into page cache, so first execs of binary
+    don't wait for disk. Done only once per process for every file.
+    """
+    if path in preloaded_files:
+        return
+    preloaded_files.add(path)
+
+    try:
+        with open(path, 'rb') as f:
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+            else:
+                while f.read(1024 * 1024):
+                    pass
+    except OSError:
+        pass
+
+
+def remove_dir(path):
+    """
+    Remove directory tree, ignore errors.
+    'rm -rf' is much faster than rmtree() on large PGDATA or backup catalog
+    """
+    if os.name == 'posix':
+        subprocess.call(
+            ['rm', '-rf', '--', path],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    else:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def copy_pgdata(src, dst):
+    """
+    Copy PGDATA preserving permissions, use reflinks
+    if filesystem supports them
+    """
+    remove_dir(dst)
+
+    if os.name == 'posix':
+        try:
+            os.makedirs(dst)
+            subprocess.check_call(
+                ['cp', '--reflink=auto', '-a', src + '/.', dst],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            return
+        except (OSError, subprocess.CalledProcessError):
+            remove_dir(dst)
+
+    shutil.copytree(src, dst)
+
+
+@functools.lru_cache(maxsize=None)
+def version_to_num(version):
+    if not version:
+        return 0
+    parts = version.split('.')
+    while len(parts) < 3:
+        parts.append('0')
+    num = 0
+    for part in parts:
+        num = num * 100 + int(re.sub("[^\d]", "", part))
+    return num
+
+
+@functools.lru_cache(maxsize=None)
+def get_pg_config_version():
+    """ Version of PostgreSQL binaries, pg_config is executed only once """
+    return version_to_num(
+        testgres.get_pg_config()['VERSION'].split(" ")[1])
+
+
 def is_enterprise():
     # pg_config --help
     if os.name == 'posix':
@@ -139,6 +343,115 @@ def slow_start(self, replica=False):
                 raise e
 
 
+def close_pg_exec_conn(node):
+    """ Close connection opened by ProbackupTest.pg_exec(), if any """
+    conn = getattr(node, 'pg_exec_conn', None)
+    node.pg_exec_conn = None
+    if conn is not None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def closing_pg_exec_conn(name):
+    """
+    Return PostgresNode method 'name', which closes connection
+    cached by ProbackupTest.pg_exec() first, as it is going
+    to be broken by server start, stop or restart
+    """
+    def method(self, *args, **kwargs):
+        close_pg_exec_conn(self)
+        return getattr(type(self), name)(self, *args, **kwargs)
+    return method
+
+
+class NodePool(object):
+    """
+    Running nodes kept between tests, see ProbackupTest.make_pooled_node().
+    Node is retired after 'max_uses' tests or if it cannot be reset.
+    """
+    max_uses = 20
+
+    def __init__(self):
+        # key -> list of idle nodes
+        self.idle = {}
+        self.counter = 0
+        atexit.register(self.close)
+
+    def get(self, key):
+        nodes = self.idle.get(key, [])
+        while nodes:
+            node = nodes.pop()
+            try:
+                if node.status() == testgres.NodeStatus.Running:
+                    return node
+            except Exception:
+                pass
+            self.retire(node)
+        return None
+
+    def put(self, key, node):
+        # reset() terminates all backends, our cached one too
+        close_pg_exec_conn(node)
+        node.pool_uses += 1
+        if node.pool_uses >= self.max_uses or not self.reset(node):
+            self.retire(node)
+        else:
+            self.idle.setdefault(key, []).append(node)
+
+    def reset(self, node):
+        """
+        Drop databases, tablespaces and replication slots
+        created by test, recreate 'postgres' database
+        """
+        try:
+            node.safe_psql(
+                'template1',
+                "SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+                "WHERE datname <> 'template1' AND pid <> pg_backend_pid()")
+            node.safe_psql(
+                'template1',
+                'SELECT pg_drop_replication_slot(slot_name) '
+                'FROM pg_replication_slots')
+
+            for row in node.execute(
+                    'template1',
+                    'SELECT datname FROM pg_database '
+                    "WHERE datname NOT IN ('template0', 'template1')"):
+                node.safe_psql(
+                    'template1', 'DROP DATABASE "{0}"'.format(row[0]))
+
+            for row in node.execute(
+                    'template1',
+                    'SELECT spcname FROM pg_tablespace '
+                    "WHERE spcname NOT IN ('pg_default', 'pg_global')"):
+                node.safe_psql(
+                    'template1', 'DROP TABLESPACE "{0}"'.format(row[0]))
+
+            node.safe_psql('template1', 'CREATE DATABASE postgres')
+            node.safe_psql('template1', 'CHECKPOINT')
+        except Exception:
+            return False
+        return True
+
+    def retire(self, node):
+        try:
+            node.stop()
+        except Exception:
+            pass
+        remove_dir(node.base_dir)
+
+    def close(self):
+        for nodes in self.idle.values():
+            for node in nodes:
+                self.retire(node)
+        self.idle = {}
+
+
+node_pool = NodePool()
+
+
 class ProbackupTest(object):
     # Class attributes
     enterprise = is_enterprise()
@@ -180,6 +493,27 @@ class ProbackupTest(object):
             if self.test_env['PG_PROBACKUP_PARANOIA'] == 'ON':
                 self.paranoia = True
 
+        # initdb doesn't fsync PGDATA, tests don't survive OS crash anyway
+        self.initdb_sync_params = ['-N']
+        if self.test_env.get('PG_PROBACKUP_INITDB_SYNC') == 'ON':
+            self.initdb_sync_params = []
+
+        # (data_dir, relname) -> relation filepath, see get_relfilepath()
+        self.relpath_cache = {}
+
+        # hash used by pgdata_content() to compare files, xxh3 is
+        # much faster than md5, but needs 'xxhash' package
+        self.pgdata_hash = hashlib.md5
+        if self.test_env.get('PG_PROBACKUP_XXHASH') == 'ON':
+            if xxhash is None:
+                print('PG_PROBACKUP_XXHASH=ON requires xxhash package')
+                exit(1)
+            self.pgdata_hash = xxhash.xxh3_128
+
+        # share of relation files hashed by pgdata_content()
+        self.paranoia_sample_rate = float(
+            self.test_env.get('PG_PROBACKUP_PARANOIA_SAMPLE_RATE', '1.0'))
+
         self.archive_compress = False
         if 'ARCHIVE_COMPRESSION' in self.test_env:
             if self.test_env['ARCHIVE_COMPRESSION'] == 'ON':
@@ -200,8 +534,17 @@ class ProbackupTest(object):
         self.tmp_path = os.path.abspath(
             os.path.join(self.dir_path, 'tmp_dirs')
             )
+        # keep nodes and backups in given directory,
+        # e.g. on tmpfs in /dev/shm
+        if self.test_env.get('PG_PROBACKUP_TEST_TMP'):
+            self.tmp_path = os.path.abspath(
+                self.test_env['PG_PROBACKUP_TEST_TMP'])
+        # every pytest-xdist worker gets its own tmp_dirs subtree
+        if 'PYTEST_XDIST_WORKER' in self.test_env:
+            self.tmp_path = os.path.join(
+                self.tmp_path, self.test_env['PYTEST_XDIST_WORKER'])
         try:
-            os.makedirs(os.path.join(self.dir_path, 'tmp_dirs'))
+            os.makedirs(self.tmp_path)
         except:
             pass
 
@@ -243,6 +586,8 @@ class ProbackupTest(object):
             print('pg_probackup binary is not found')
             exit(1)
 
+        preload_file(self.probackup_path)
+
         if os.name == 'posix':
             self.EXTERNAL_DIRECTORY_DELIMITER = ':'
             os.environ['PATH'] = os.path.dirname(
@@ -275,8 +620,7 @@ class ProbackupTest(object):
 
     @property
     def pg_config_version(self):
-        return self.version_to_num(
-            testgres.get_pg_config()['VERSION'].split(" ")[1])
+        return get_pg_config_version()
 
 #            if 'PGPROBACKUP_SSH_HOST' in self.test_env:
 #                self.remote_host = self.test_env['PGPROBACKUP_SSH_HOST']
@@ -303,18 +647,39 @@ class ProbackupTest(object):
             base_dir=None,
             set_replication=False,
             initdb_params=[],
-            pg_options={}):
+            pg_options={},
+            template=None):
+        """
+        If 'template' is given, PGDATA is copied from it
+        instead of running initdb, see get_initdb_template()
+        """
 
         real_base_dir = os.path.join(self.tmp_path, base_dir)
-        shutil.rmtree(real_base_dir, ignore_errors=True)
+        remove_dir(real_base_dir)
         os.makedirs(real_base_dir)
 
-        node = testgres.get_new_node('test', base_dir=real_base_dir)
+        node = testgres.get_new_node(
+            'test', base_dir=real_base_dir, port=get_xdist_worker_port())
         # bound method slow_start() to 'node' class instance
         node.slow_start = slow_start.__get__(node)
+        # close connection cached by pg_exec() on every start,
+        # stop or restart, slow_start() calls start() too
+        for name in ('start', 'stop', 'restart', 'kill'):
+            if hasattr(type(node), name):
+                setattr(
+                    node, name, closing_pg_exec_conn(name).__get__(node))
         node.should_rm_dirs = True
-        node.init(
-           initdb_params=initdb_params, allow_streaming=set_replication)
+
+        if template:
+            copy_pgdata(template, node.data_dir)
+            if not os.path.exists(node.logs_dir):
+                os.makedirs(node.logs_dir)
+            # write port, pg_hba.conf and so on, like init() does
+            node.default_conf(allow_streaming=set_replication)
+        else:
+            node.init(
+               initdb_params=list(initdb_params) + self.initdb_sync_params,
+               allow_streaming=set_replication)
 
         # Sane default parameters
         node.append_conf('postgresql.auto.conf', 'max_connections = 100')
@@ -344,6 +709,80 @@ class ProbackupTest(object):
 
         return node
 
+    def make_pooled_node(
+            self, set_replication=False, initdb_params=[], pg_options={}):
+        """
+        Return running node from node_pool, or make and start a new one.
+        After the test node is reset and returned to the pool, so test
+        must not change node configuration, files in PGDATA or roles.
+        """
+        key = (
+            set_replication, tuple(initdb_params),
+            tuple(sorted(pg_options.items())))
+
+        node = node_pool.get(key)
+        if node is None:
+            node_pool.counter += 1
+            node = self.make_simple_node(
+                base_dir=os.path.join('node_pool', str(node_pool.counter)),
+                set_replication=set_replication,
+                initdb_params=initdb_params,
+                pg_options=pg_options,
+                template=self.get_initdb_template(initdb_params))
+            node.pool_uses = 0
+            node.slow_start()
+
+        self.addCleanup(node_pool.put, key, node)
+        return node
+
+    def get_initdb_template(self, initdb_params=[]):
+        """
+        Return path to PGDATA initdb'ed with given params.
+        initdb is executed only once per process for every set of params.
+        Nodes made from the same template share system identifier.
+        """
+        key = tuple(initdb_params)
+        if key in initdb_templates:
+            return initdb_templates[key]
+
+        template = os.path.join(
+            self.tmp_path, 'initdb_templates',
+            hashlib.md5(' '.join(key).encode('utf-8')).hexdigest())
+        remove_dir(template)
+
+        self.run_binary(
+            [self.get_bin_path('initdb'), '-D', template] +
+            self.initdb_sync_params + list(initdb_params))
+
+        initdb_templates[key] = template
+        return template
+
+    def get_pgbench_template(self, initdb_params=[], scale=1):
+        """
+        Return path to PGDATA initdb'ed with given params and
+        initialized by 'pgbench -i -s scale'. Template is built only
+        once per process, so nodes made from it skip pgbench_init().
+        """
+        key = ('pgbench', scale, tuple(initdb_params))
+        if key in initdb_templates:
+            return initdb_templates[key]
+
+        node = self.make_simple_node(
+            base_dir=os.path.join(
+                'initdb_templates',
+                'pgbench_{0}_{1}'.format(
+                    scale,
+                    hashlib.md5(
+                        ' '.join(initdb_params).encode('utf-8')).hexdigest())),
+            initdb_params=initdb_params,
+            template=self.get_initdb_template(initdb_params))
+        node.slow_start()
+        node.pgbench_init(scale=scale)
+        node.stop()
+
+        initdb_templates[key] = node.data_dir
+        return node.data_dir
+
     def create_tblspace_in_node(self, node, tblspc_name, tblspc_path=None, cfs=False):
         res = node.execute(
             'postgres',
@@ -389,6 +828,105 @@ class ProbackupTest(object):
                     fork_name))[0][0]
             )
 
+    def pg_exec(self, node, sql, fetch=False, copy_data=None):
+        """
+        Execute 'sql' in 'postgres' database of 'node' via persistent
+        autocommit connection, which is opened on first call and closed
+        when node is started, stopped or restarted. It is much cheaper
+        than safe_psql(), which spawns psql for every query.
+        If 'fetch' is True, return first column of the first row.
+        If 'copy_data' is given, 'sql' is 'COPY ... FROM STDIN'
+        and 'copy_data' bytes are sent as its input.
+        """
+        conn = getattr(node, 'pg_exec_conn', None)
+        if conn is None:
+            conn = node.connect('postgres', autocommit=True)
+            node.pg_exec_conn = conn
+
+        if copy_data is not None:
+            # testgres uses either psycopg2 or pg8000
+            if hasattr(conn.cursor, 'copy_expert'):
+                conn.cursor.copy_expert(sql, io.BytesIO(copy_data))
+            else:
+                conn.cursor.execute(sql, stream=io.BytesIO(copy_data))
+            return
+
+        res = conn.execute(sql)
+        if fetch:
+            return res[0][0] if res else None
+
+    def populate_t_heap(
+            self, node, relname='t_heap', tablespace=None, checkpoint=False):
+        """
+        Create table 'relname' with the usual t_heap content:
+        1001 rows of (id, text, tsvector). Rows are precomputed
+        in t_heap_payload and loaded with COPY.
+        If 'checkpoint' is True, execute CHECKPOINT after that.
+        Return path of the table relative to PGDATA.
+        """
+        cmd = 'CREATE TABLE {0} (id int, text text, tsvector tsvector)'
+        cmd = cmd.format(relname)
+        if tablespace:
+            cmd += ' TABLESPACE {0}'.format(tablespace)
+        self.pg_exec(node, cmd)
+
+        self.pg_exec(
+            node, 'COPY {0} FROM STDIN'.format(relname),
+            copy_data=t_heap_payload)
+
+        if checkpoint:
+            self.pg_exec(node, 'CHECKPOINT')
+
+        return self.get_relfilepath(node, relname)
+
+    def get_relfilepath(self, node, relname):
+        """
+        Return path of relation main fork relative to PGDATA.
+        Lookup is done once per test for every relation.
+        """
+        key = (node.data_dir, relname)
+        if key not in self.relpath_cache:
+            self.relpath_cache[key] = self.pg_exec(
+                node,
+                "select pg_relation_filepath('{0}')".format(relname),
+                fetch=True)
+
+        return self.relpath_cache[key]
+
+    def assert_log_contains(
+            self, log_path, *needles, msg=None, negate=False):
+        """
+        Check that log file contains every given string,
+        or, if 'negate' is set, that it contains none of them.
+        File is mmap'ed and searched as bytes from the end, without
+        reading and decoding it: messages we are looking for are
+        usually written by the last command, so are close to the tail.
+        """
+        with open(log_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                log = b''
+            else:
+                log = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+            try:
+                for needle in needles:
+                    if not isinstance(needle, bytes):
+                        needle = needle.encode('utf-8')
+                    if negate:
+                        self.assertEqual(
+                            log.rfind(needle), -1,
+                            msg or 'Log file "{0}" contains: {1}'.format(
+                                log_path, repr(needle)))
+                    else:
+                        self.assertNotEqual(
+                            log.rfind(needle), -1,
+                            msg or
+                            'Log file "{0}" does not contain: {1}'.format(
+                                log_path, repr(needle)))
+            finally:
+                if isinstance(log, mmap.mmap):
+                    log.close()
+
     def get_md5_per_page_for_fork(self, file, size_in_pages):
         pages_per_segment = {}
         md5_per_page = {}
@@ -683,7 +1221,7 @@ class ProbackupTest(object):
 
     def init_pb(self, backup_dir, options=[], old_binary=False):
 
-        shutil.rmtree(backup_dir, ignore_errors=True)
+        remove_dir(backup_dir)
 
         # don`t forget to kill old_binary after remote ssh release
         if self.remote and not old_binary:
@@ -736,7 +1274,7 @@ class ProbackupTest(object):
         )
 
     def clean_pb(self, backup_dir):
-        shutil.rmtree(backup_dir, ignore_errors=True)
+        remove_dir(backup_dir)
 
     def backup_node(
             self, backup_dir, instance, node, data_dir=False,
@@ -776,7 +1314,7 @@ class ProbackupTest(object):
 
     def checkdb_node(
             self, backup_dir=False, instance=False, data_dir=False,
-            options=[], async=False, gdb=False, old_binary=False
+            options=[], asynchronous=False, gdb=False, old_binary=False
             ):
 
         cmd_list = ["checkdb"]
@@ -790,7 +1328,7 @@ class ProbackupTest(object):
         if data_dir:
             cmd_list += ["-D", data_dir]
 
-        return self.run_pb(cmd_list + options, async, gdb, old_binary)
+        return self.run_pb(cmd_list + options, asynchronous, gdb, old_binary)
 
     def merge_backup(
             self, backup_dir, instance, backup_id, asynchronous=False,
@@ -1129,15 +1667,7 @@ class ProbackupTest(object):
         return getpass.getuser()
 
     def version_to_num(self, version):
-        if not version:
-            return 0
-        parts = version.split('.')
-        while len(parts) < 3:
-            parts.append('0')
-        num = 0
-        for part in parts:
-            num = num * 100 + int(re.sub("[^\d]", "", part))
-        return num
+        return version_to_num(version)
 
     def switch_wal_segment(self, node):
         """
@@ -1185,8 +1715,7 @@ class ProbackupTest(object):
             "SELECT '{0}'::pg_lsn <= {1}".format(lsn, replica_function))
 
     def get_version(self, node):
-        return self.version_to_num(
-            testgres.get_pg_config()['VERSION'].split(" ")[1])
+        return get_pg_config_version()
 
     def get_bin_path(self, binary):
         return testgres.get_bin_path(binary)
@@ -1198,22 +1727,23 @@ class ProbackupTest(object):
         except:
             pass
 
-        shutil.rmtree(
-            os.path.join(
-                self.tmp_path,
-                module_name,
-                fname
-            ),
-            ignore_errors=True
-        )
+        remove_dir(os.path.join(self.tmp_path, module_name, fname))
         try:
             os.rmdir(os.path.join(self.tmp_path, module_name))
         except:
             pass
 
-    def pgdata_content(self, pgdata, ignore_ptrack=True, exclude_dirs=None):
+    def pgdata_content(
+            self, pgdata, ignore_ptrack=True,
+            exclude_dirs=None, sample_rate=None):
         """ return dict with directory content. "
-        " TAKE IT AFTER CHECKPOINT or BACKUP"""
+        " TAKE IT AFTER CHECKPOINT or BACKUP"
+        " Only 'sample_rate' share of relation files is hashed, by default
+        " it is 1.0 or PG_PROBACKUP_PARANOIA_SAMPLE_RATE if set"""
+        if sample_rate is None:
+            sample_rate = self.paranoia_sample_rate
+        sample_seed = self.test_env.get('CI_RUN_ID', '0')
+
         dirs_to_ignore = [
             'pg_xlog', 'pg_wal', 'pg_log',
             'pg_stat_tmp', 'pg_subtrans', 'pg_notify'
@@ -1234,9 +1764,9 @@ class ProbackupTest(object):
         directory_dict['pgdata'] = pgdata
         directory_dict['files'] = {}
         directory_dict['dirs'] = {}
-        for root, dirs, files in os.walk(pgdata, followlinks=True):
-            dirs[:] = [d for d in dirs if d not in dirs_to_ignore]
-            for file in files:
+        hash_jobs = {}
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+            for root, file in scan_files(pgdata, dirs_to_ignore):
                 if (
                     file in files_to_ignore or
                     (ignore_ptrack and file.endswith('_ptrack'))
@@ -1245,18 +1775,39 @@ class ProbackupTest(object):
 
                 file_fullpath = os.path.join(root, file)
                 file_relpath = os.path.relpath(file_fullpath, pgdata)
-                directory_dict['files'][file_relpath] = {'is_datafile': False}
-                directory_dict['files'][file_relpath]['md5'] = hashlib.md5(
-                    open(file_fullpath, 'rb').read()).hexdigest()
 
                 # crappy algorithm
-                if file.isdigit():
-                    directory_dict['files'][file_relpath]['is_datafile'] = True
-                    size_in_pages = os.path.getsize(file_fullpath)/8192
+                directory_dict['files'][file_relpath] = {
+                    'is_datafile': file.isdigit()}
+
+                # Skipped files are still listed, so missing or extra
+                # files are always detected, only their content is not
+                # compared. Choice depends only on file path and CI_RUN_ID,
+                # so it is the same for original and restored PGDATA,
+                # but different CI runs check different files
+                if (
+                    sample_rate < 1.0 and file.isdigit() and
+                    random.Random(
+                        sample_seed + file_relpath).random() >= sample_rate
+                ):
+                    directory_dict['files'][file_relpath]['md5'] = None
+                    directory_dict['files'][file_relpath]['md5_per_page'] = {}
+                    continue
+
+                # hashlib releases GIL while hashing, so files
+                # are read and hashed concurrently
+                hash_jobs[file_relpath] = pool.submit(
+                    hash_file, file_fullpath, self.pgdata_hash,
+                    per_page=file.isdigit())
+
+            for file_relpath, job in hash_jobs.items():
+                file_hash, page_hashes = job.result()
+                # keys are named 'md5' whatever hash is used,
+                # compare_pgdata() relies on them
+                directory_dict['files'][file_relpath]['md5'] = file_hash
+                if directory_dict['files'][file_relpath]['is_datafile']:
                     directory_dict['files'][file_relpath][
-                        'md5_per_page'] = self.get_md5_per_page_for_fork(
-                            file_fullpath, size_in_pages
-                        )
+                        'md5_per_page'] = page_hashes
 
         for root, dirs, files in os.walk(pgdata, topdown=False, followlinks=True):
             for directory in dirs:
@@ -1486,14 +2037,28 @@ class GDBobj(ProbackupTest):
             else:
                 break
 
-    def set_breakpoint(self, location):
+    def set_breakpoint(self, location, ignore=0, temporary=False):
+        """
+        Set breakpoint at 'location'. With 'ignore' gdb itself skips
+        first 'ignore' hits of breakpoint, so there is no need to
+        call continue_execution_until_break() to get there.
+        Temporary breakpoint is deleted by gdb after it is hit,
+        so remove_all_breakpoints() is not needed.
+        """
+        if temporary:
+            cmd = 'tbreak '
+        else:
+            cmd = 'break '
 
-        result = self._execute('break ' + location)
+        result = self._execute(cmd + location)
         for line in result:
-            if line.startswith('~"Breakpoint'):
-                return
-
-            elif line.startswith('=breakpoint-created'):
+            if (
+                line.startswith('~"Breakpoint') or
+                line.startswith('~"Temporary breakpoint') or
+                line.startswith('=breakpoint-created')
+            ):
+                if ignore > 0:
+                    self._set_ignore_count(ignore)
                 return
 
             elif line.startswith('^error'): #or line.startswith('(gdb)'):
@@ -1515,6 +2080,16 @@ class GDBobj(ProbackupTest):
             'Failed to set breakpoint.\n Output:\n {0}'.format(result)
         )
 
+    def _set_ignore_count(self, ignore_count):
+        # $bpnum is the number of the last breakpoint set
+        result = self._execute('ignore $bpnum ' + str(ignore_count))
+        for line in result:
+            if line.startswith('^done'):
+                return
+
+        raise GdbException(
+            'Failed to set ignore count.\n Output:\n {0}'.format(result))
+
     def remove_all_breakpoints(self):
 
         result = self._execute('delete')
@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+
+def test_serial_tests_are_grouped(pytester):
+    """
+    Tests decorated with @serial must get 'serial' xdist group,
+    so with '--dist=loadgroup' they all run on the same worker.
+    Run with 'python -m pytest tests/serial_marker.py'
+    """
+    pytest.importorskip('xdist')
+
+    with open(os.path.join(os.path.dirname(__file__), 'conftest.py')) as f:
+        pytester.makeconftest(f.read())
+
+    pytester.makepyfile(
+        """
+        import pytest
+
+
+        def serial(func):
+            func.serial = True
+            return func
+
+
+        @serial
+        def test_decorated():
+            pass
+
+
+        @pytest.mark.serial
+        def test_marked():
+            pass
+
+
+        def test_plain():
+            pass
+        """)
+
+    result = pytester.runpytest('-n', '2', '--dist=loadgroup', '-v')
+    result.assert_outcomes(passed=3)
+    result.stdout.fnmatch_lines([
+        '*test_decorated@serial*',
+        '*test_marked@serial*'])
+    result.stdout.no_fnmatch_line('*test_plain@*')